@@ -1,17 +1,18 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import camelot
 import tempfile
 import os
 import re
-from PyPDF2 import PdfReader
+import unicodedata
 import base64
 import pdfplumber
 from datetime import datetime
 from io import BytesIO
 
 # Para o fuzzy matching
-from fuzzywuzzy import process, fuzz
+from rapidfuzz import process, fuzz, utils
 
 # Para gerar PDFs
 from fpdf import FPDF
@@ -33,6 +34,14 @@ st.set_page_config(
 LOGO_PATH = "MP.png"  # Ajuste se necessário
 GLOSSARY_PATH = "Rubricas.txt"  # Ajuste se necessário
 
+# Expressões regulares (compiladas uma única vez)
+_RE_NOME_TXT = re.compile(r"([^\d]+)")
+_RE_MATRICULA = re.compile(r"(\d{3}\.\d{3}-\d\s*[A-Z]*)")
+_RE_DATA = re.compile(r"\d{2}/\d{4}")
+_RE_SANITIZE = re.compile(r"[^\w\-_\.]", re.UNICODE)
+_RE_VALOR_US = re.compile(r"([\d,]+\.\d{2})")
+_RE_MATR_TITLE = re.compile(r"(\d+),(\d{3}-\d\s*[A-Za-z])")
+
 # Variável para armazenar valores importantes (fallback quando session_state não estiver disponível)
 _fallback_state = {
     "df_contracheques": None,
@@ -69,19 +78,37 @@ def set_state_value(key, value):
 # -----------------------------------------------------------------
 # FUNÇÕES GERAIS
 # -----------------------------------------------------------------
+CACHE_TTL = 24 * 60 * 60  # Tempo de vida (s) do cache de arquivos lidos do disco
+
+
+def _mtime_arquivo(path):
+    """Retorna a data de modificação do arquivo (ou None), usada como chave de cache."""
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+@st.cache_data(ttl=CACHE_TTL)
+def _ler_imagem_base64(file_path, mtime):
+    with open(file_path, "rb") as img_file:
+        return base64.b64encode(img_file.read()).decode()
+
+
+@st.cache_data(ttl=CACHE_TTL)
+def _ler_linhas_texto(path, mtime):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
 def get_image_base64(file_path):
     """Carrega imagem e retorna string base64 para exibir no Streamlit."""
     if not os.path.exists(file_path):
         return ""
-    with open(file_path, "rb") as img_file:
-        return base64.b64encode(img_file.read()).decode()
+    return _ler_imagem_base64(file_path, _mtime_arquivo(file_path))
 
 
 def carregar_glossario(path):
     """Carrega Rubricas de um arquivo texto."""
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return f.read().splitlines()
+        return _ler_linhas_texto(path, _mtime_arquivo(path))
     except Exception as e:
         st.error(f"Erro ao carregar glossário: {e}")
         return []
@@ -97,7 +124,11 @@ def sanitizar_para_arquivo(texto: str) -> str:
     Remove caracteres indesejados para uso em nomes de arquivos.
     """
     texto = texto.strip().replace(" ", "_")
-    return re.sub(r"[^\w\-_\.]", "", texto, flags=re.UNICODE)
+    return _RE_SANITIZE.sub("", texto)
+
+
+# Troca simultânea de separadores: "1,234.56" -> "1.234,56"
+_BR_TRANS = str.maketrans({",": ".", ".": ","})
 
 
 def formatar_valor_brl(valor: str) -> str:
@@ -106,17 +137,57 @@ def formatar_valor_brl(valor: str) -> str:
     """
     try:
         flt = float(valor.replace(",", "").replace(".", "")) / 100
-        return f"{flt:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+        return f"{flt:,.2f}".translate(_BR_TRANS)
     except:
         return valor
 
 
+def formatar_coluna_brl(valores: pd.Series) -> pd.Series:
+    """
+    Versão vetorizada de formatar_valor_brl para uma coluna inteira.
+    Valores que não puderem ser convertidos são mantidos como texto original.
+    """
+    textos = valores.astype(str)
+    digitos = (
+        textos.str.replace(",", "", regex=False)
+        .str.replace(".", "", regex=False)
+        .str.strip()
+    )
+    numeros = pd.to_numeric(digitos, errors="coerce") / 100
+    validos = numeros.notna()
+    textos[validos] = numeros[validos].map(lambda v: f"{v:,.2f}".translate(_BR_TRANS))
+    return textos
+
+
+def converter_valores_br(valores: pd.Series) -> pd.Series:
+    """
+    Converte valores no padrão PT-BR ("1.234,56") para float, de forma vetorizada.
+    Valores inválidos ou vazios são considerados 0.
+    """
+    limpos = (
+        valores.astype(str)
+        .str.replace(".", "", regex=False)
+        .str.replace(",", ".", regex=False)
+        .str.strip()
+    )
+    return pd.to_numeric(limpos, errors="coerce").fillna(0.0)
+
+
 # -----------------------------------------------------------------
-# EXTRAIR NOME E MATRÍCULA (via pdfplumber)
+# EXTRAIR TEXTO, NOME E MATRÍCULA (via pdfplumber)
 # -----------------------------------------------------------------
-def extrair_nome_e_matricula(pdf_path):
+def extrair_textos_pdf(pdf_path):
     """
-    Extrai Nome e Matrícula (MATRÍCULA-SEQ-DIG) do PDF usando pdfplumber.
+    Abre o PDF uma única vez com pdfplumber e retorna a lista com o texto
+    de cada página (na ordem das páginas).
+    """
+    with pdfplumber.open(pdf_path) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages]
+
+
+def extrair_nome_e_matricula(textos_paginas):
+    """
+    Extrai Nome e Matrícula (MATRÍCULA-SEQ-DIG) do texto da 1ª página do PDF.
     Exemplo de trecho que pode existir no PDF:
       NOME
       FULANO DE TAL
@@ -127,26 +198,24 @@ def extrair_nome_e_matricula(pdf_path):
     """
     nome = "N/D"
     matricula = "N/D"
-    with pdfplumber.open(pdf_path) as pdf:
-        if len(pdf.pages) > 0:
-            text = pdf.pages[0].extract_text() or ""
-            lines = text.split("\n")
-
-            for i, linha in enumerate(lines):
-                if "NOME" in linha.upper():
-                    if i + 1 < len(lines):
-                        valor_nome = lines[i + 1].strip()
-                        # Pega apenas parte textual sem números, se houver
-                        match_nome = re.match(r"([^\d]+)", valor_nome)
-                        if match_nome:
-                            nome = match_nome.group(1).strip()
-                if "MATRÍCULA-SEQ-DIG" in linha.upper():
-                    if i + 1 < len(lines):
-                        valor_matr = lines[i + 1].strip()
-                        # Tenta casar algo como 014.642-0 C
-                        matr_match = re.search(r"(\d{3}\.\d{3}-\d\s*[A-Z]*)", valor_matr)
-                        if matr_match:
-                            matricula = matr_match.group(1).strip()
+    if textos_paginas:
+        lines = textos_paginas[0].split("\n")
+
+        for i, linha in enumerate(lines):
+            if "NOME" in linha.upper():
+                if i + 1 < len(lines):
+                    valor_nome = lines[i + 1].strip()
+                    # Pega apenas parte textual sem números, se houver
+                    match_nome = _RE_NOME_TXT.match(valor_nome)
+                    if match_nome:
+                        nome = match_nome.group(1).strip()
+            if "MATRÍCULA-SEQ-DIG" in linha.upper():
+                if i + 1 < len(lines):
+                    valor_matr = lines[i + 1].strip()
+                    # Tenta casar algo como 014.642-0 C
+                    matr_match = _RE_MATRICULA.search(valor_matr)
+                    if matr_match:
+                        matricula = matr_match.group(1).strip()
 
     return nome or "N/D", matricula or "N/D"
 
@@ -154,54 +223,56 @@ def extrair_nome_e_matricula(pdf_path):
 # -----------------------------------------------------------------
 # FUNÇÕES AUXILIARES CAMELOT
 # -----------------------------------------------------------------
-def extrair_data_da_pagina(pdf_path, page_number):
+def mapear_paginas_com_tabela(textos_paginas):
     """
-    Utiliza PyPDF2 para extrair texto cru e procurar datas (MM/AAAA) em uma página específica.
+    A partir do texto já extraído de cada página, retorna um dict
+    {número da página: data (MM/AAAA)} apenas para as páginas que contêm o
+    cabeçalho "DESCRIÇÃO". Se a data não for encontrada, usa "N/D".
     """
-    with open(pdf_path, 'rb') as f:
-        reader = PdfReader(f)
-        if page_number - 1 < len(reader.pages):
-            text = reader.pages[page_number - 1].extract_text() or ""
-            match = re.search(r"\d{2}/\d{4}", text)
-            if match:
-                return match.group(0)
-    return "N/D"
+    paginas = {}
+    for page_number, text in enumerate(textos_paginas, start=1):
+        if "DESCRIÇÃO" in text.upper():
+            match = _RE_DATA.search(text)
+            paginas[page_number] = match.group(0) if match else "N/D"
+    return paginas
 
 
 def _separar_linhas_multiplas(df: pd.DataFrame) -> pd.DataFrame:
     """
     Separa texto com quebras de linha (\n) em múltiplas linhas do DataFrame.
     """
-    linhas_expandidas = []
-    for _, row in df.iterrows():
-        col_split = [str(row[col]).split('\n') for col in df.columns]
-        max_splits = max(len(c) for c in col_split)
-        for i in range(max_splits):
-            nova_linha = {}
-            for c, col_name in enumerate(df.columns):
-                partes = col_split[c]
-                nova_linha[col_name] = partes[i].strip() if i < len(partes) else ''
-            linhas_expandidas.append(nova_linha)
-    return pd.DataFrame(linhas_expandidas)
+    colunas = {}
+    for col_name in df.columns:
+        partes = df[col_name].astype(str).str.split('\n').explode()
+        # Indexa cada parte por (linha original, posição da parte na célula)
+        partes.index = pd.MultiIndex.from_arrays([partes.index, partes.groupby(level=0).cumcount()])
+        colunas[col_name] = partes.str.strip()
+    # O alinhamento pelo índice completa com '' as colunas com menos partes
+    return pd.DataFrame(colunas).sort_index().fillna('').reset_index(drop=True)
 
 
-def processar_contracheques_camelot(pdf_path):
+def processar_contracheques_camelot(pdf_path, textos_paginas):
     """
     Lê tabelas do PDF com Camelot (flavor='stream') e retorna DataFrame
     com colunas: "COD", "Descrição", "TOTAL", "DATA".
+    'textos_paginas' é o texto de cada página (ver extrair_textos_pdf).
     """
+    colunas = ["DATA", "Competência", "Descrição", "PVD", "COD", "BASE", "VALOR UNITÁRIO", "TOTAL"]
     try:
+        # Só passa ao Camelot as páginas que têm tabela de contracheque
+        datas_paginas = mapear_paginas_com_tabela(textos_paginas)
+        if not datas_paginas:
+            return pd.DataFrame(columns=colunas)
+
         tables = camelot.read_pdf(
             pdf_path,
-            pages="all",
+            pages=",".join(map(str, datas_paginas)),
             flavor="stream",
             row_tol=15,
             strip_text=''
         )
-        dados = pd.DataFrame(
-            columns=["DATA", "Competência", "Descrição", "PVD", "COD", "BASE", "VALOR UNITÁRIO", "TOTAL"]
-        )
 
+        frames = []
         for table in tables:
             df = table.df
             # Verifica se existe a linha de cabeçalho com "DESCRIÇÃO"
@@ -218,10 +289,12 @@ def processar_contracheques_camelot(pdf_path):
 
                 # Marca de qual página veio a tabela (Competência = Página X)
                 df["Competência"] = f"Página {table.page}"
-                data_encontrada = extrair_data_da_pagina(pdf_path, table.page)
+                data_encontrada = datas_paginas.get(int(table.page), "N/D")
                 df.insert(0, "DATA", data_encontrada)  # Insere DATA logo na 1ª posição
-                dados = pd.concat([dados, df], ignore_index=True)
+                frames.append(df)
 
+        # Concatena todas as tabelas de uma só vez
+        dados = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=colunas)
         if not dados.empty:
             # Reordena colunas para exibir final
             dados = dados[["COD", "Descrição", "TOTAL", "DATA"]]
@@ -231,6 +304,31 @@ def processar_contracheques_camelot(pdf_path):
         return None
 
 
+@st.cache_data
+def _processar_pdf(file_bytes: bytes):
+    """
+    Processa o PDF enviado (em bytes) uma única vez por conteúdo:
+    retorna (df_contracheques, nome, matrícula).
+    O cache evita reprocessar o mesmo arquivo a cada interação com a página.
+    """
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
+        tmp_file.write(file_bytes)
+        pdf_path = tmp_file.name
+
+    try:
+        # Texto de todas as páginas numa única abertura do PDF
+        textos_paginas = extrair_textos_pdf(pdf_path)
+        # Extrair nome e matrícula
+        nome, matricula = extrair_nome_e_matricula(textos_paginas)
+        # Ler tabelas Camelot
+        df_contra = processar_contracheques_camelot(pdf_path, textos_paginas)
+    finally:
+        # Remove o arquivo temporário do PDF original
+        os.unlink(pdf_path)
+
+    return df_contra, nome, matricula
+
+
 # -----------------------------------------------------------------
 # PDF “Tabelas (SEAD / AMAZONPREV)”
 # -----------------------------------------------------------------
@@ -288,29 +386,35 @@ class PDFRelatorioCamelot(FPDF):
         row_h = 7
         self.set_font("Arial", "", 9)
 
-        for _, rowv in df.iterrows():
-            if self.get_y() + row_h + 15 > self.h:  # Evitar estouro de página
-                self.add_page()
+        # Linhas que cabem por página (evita estouro sem consultar get_y a cada linha)
+        rows_per_page = int((self.h - self.get_y() - 15) / row_h)
+        self._row_on_page = 0
 
-            cod_s = str(rowv["COD"])
-            desc_s = str(rowv["Descrição"])
-            tot_s = str(rowv["TOTAL"])
-            dat_s = str(rowv["DATA"])
+        # Formata campo de total de uma só vez
+        df = df.assign(TOTAL=formatar_coluna_brl(df["TOTAL"]))
 
-            # Formata campo de total
-            if tot_s.strip():
-                tot_s = formatar_valor_brl(tot_s)
+        i_cod, i_desc, i_tot, i_dat = df.columns.get_indexer(["COD", "Descrição", "TOTAL", "DATA"])
+        for row in df.itertuples(index=False, name=None):
+            if self._row_on_page == rows_per_page:
+                self.add_page()
+                self._row_on_page = 0
+
+            cod_s = str(row[i_cod])
+            desc_s = str(row[i_desc])
+            tot_s = str(row[i_tot])
+            dat_s = str(row[i_dat])
 
             self.cell(30, row_h, cod_s, border=1, align='C')
             self.cell(150, row_h, desc_s, border=1, align='L')
             self.cell(40, row_h, tot_s, border=1, align='R')
             self.cell(30, row_h, dat_s, border=1, align='C')
             self.ln(row_h)
+            self._row_on_page += 1
 
-    def gerar_pdf(self, df, out_path):
+    def gerar_pdf(self, df) -> bytes:
         self.add_page()
         self.montar_tabela(df)
-        self.output(out_path)
+        return bytes(self.output())
 
 
 def salvar_em_pdf_camelot(df, titulo_pdf, nome_user, nit_user) -> bytes:
@@ -318,18 +422,21 @@ def salvar_em_pdf_camelot(df, titulo_pdf, nome_user, nit_user) -> bytes:
     Gera o PDF final (em bytes) das tabelas (SEAD / AMAZONPREV).
     """
     pdf = PDFRelatorioCamelot(titulo_pdf, nome_user, nit_user)
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf:
-        out_path = tmp_pdf.name
-    pdf.gerar_pdf(df, out_path)
-    with open(out_path, "rb") as f:
-        data_bytes = f.read()
-    os.remove(out_path)
-    return data_bytes
+    return pdf.gerar_pdf(df)
 
 
 # -----------------------------------------------------------------
 # FUNÇÃO para inserir linhas de total A/B e cálculo de indébito
 # -----------------------------------------------------------------
+# Descrições das linhas especiais (destacadas nos relatórios finais)
+LINHAS_ESPECIAIS = (
+    "A = Valor Total (R$)",
+    "B = Valor Recebido - Autor (a)",
+    "Indébito (A-B)",
+    "Indébito em dobro (R$)"
+)
+
+
 def inserir_totais_na_coluna(df, col_valor="DESCONTOS"):
     """
     Insere linhas ao final da coluna 'col_valor' com:
@@ -342,23 +449,14 @@ def inserir_totais_na_coluna(df, col_valor="DESCONTOS"):
     Se não fornecido ou inválido, considera 0.
     """
 
-    def _to_float(x):
-        try:
-            return float(str(x).replace(',', '.').strip())
-        except:
-            return 0.0
-
     # Soma de A
-    soma = df[col_valor].apply(_to_float).sum()
+    soma = converter_valores_br(df[col_valor]).sum()
     if soma == 0:
         return df
 
     # Recupera B do estado
     valor_recebido_str = get_state_value("valor_recebido") or "0"
-    try:
-        valor_recebido_num = float(valor_recebido_str.replace(',', '.').strip())
-    except:
-        valor_recebido_num = 0.0
+    valor_recebido_num = float(converter_valores_br(pd.Series([valor_recebido_str])).iloc[0])
 
     # Indébito
     indebito = soma - valor_recebido_num
@@ -370,38 +468,15 @@ def inserir_totais_na_coluna(df, col_valor="DESCONTOS"):
     indebito_str = f"{indebito:,.2f}"
     indebito_dobro_str = f"{indebito_dobro:,.2f}"
 
-    df_novo = df.copy()
-    # Linha A
-    df_novo = pd.concat([
-        df_novo,
-        pd.DataFrame({col_valor: [A_str], "DESCRIÇÃO": ["A = Valor Total (R$)"]})
-    ], ignore_index=True)
-    # Linha B
-    df_novo = pd.concat([
-        df_novo,
-        pd.DataFrame({col_valor: [B_str], "DESCRIÇÃO": ["B = Valor Recebido - Autor (a)"]})
-    ], ignore_index=True)
-    # Linha Indébito
-    df_novo = pd.concat([
-        df_novo,
-        pd.DataFrame({col_valor: [indebito_str], "DESCRIÇÃO": ["Indébito (A-B)"]})
-    ], ignore_index=True)
-    # Linha Indébito em dobro
-    df_novo = pd.concat([
-        df_novo,
-        pd.DataFrame({col_valor: [indebito_dobro_str], "DESCRIÇÃO": ["Indébito em dobro (R$)"]})
-    ], ignore_index=True)
-
-    # Limpa demais colunas nas linhas especiais
-    mask_especial = df_novo["DESCRIÇÃO"].isin([
-        "A = Valor Total (R$)",
-        "B = Valor Recebido - Autor (a)",
-        "Indébito (A-B)",
-        "Indébito em dobro (R$)"
-    ])
-    for c in df_novo.columns:
-        if c not in ["DESCRIÇÃO", col_valor]:
-            df_novo.loc[mask_especial, c] = ""
+    # Monta as quatro linhas especiais de uma vez e concatena numa única operação
+    especiais = pd.DataFrame({
+        "DESCRIÇÃO": list(LINHAS_ESPECIAIS),
+        col_valor: [A_str, B_str, indebito_str, indebito_dobro_str]
+    })
+    # Demais colunas ficam vazias nas linhas especiais
+    especiais = especiais.reindex(columns=df.columns, fill_value="")
+
+    df_novo = pd.concat([df, especiais], ignore_index=True, copy=False)
 
     return df_novo
 
@@ -449,106 +524,123 @@ class PDFFinais(FPDF):
             self.cell(w, row_h, col_h, border=1, align='C', fill=True)
         self.ln()
 
-    def montar_tabela(self, df):
+    def montar_tabela(self, colunas, is_especial):
+        """
+        Escreve as linhas no PDF a partir das colunas já preparadas
+        (ver preparar_colunas_finais).
+        """
         row_h = 7
-        col_names = df.columns.tolist()
+        col_names = list(colunas)
         widths_map = {
             "COD": 30,
             "DESCRIÇÃO": 120,
             "DESCONTOS": 40,
             "DATA": 30
         }
+        col_specs = [
+            (colunas[col_h], widths_map.get(col_h, 40), 'L' if col_h.upper() == "DESCRIÇÃO" else 'C')
+            for col_h in col_names
+        ]
         # Desenha cabeçalho
         self.montar_cab(col_names, widths_map)
         self.set_font("Arial", "", 9)
 
-        for _, rowv in df.iterrows():
-            if self.get_y() + row_h + 15 > self.h:
+        # Linhas que cabem por página (evita estouro sem consultar get_y a cada linha)
+        rows_per_page = int((self.h - self.get_y() - 15) / row_h)
+        self._row_on_page = 0
+
+        for i in range(len(is_especial)):
+            if self._row_on_page == rows_per_page:
                 self.add_page()
                 self.montar_cab(col_names, widths_map)
+                self._row_on_page = 0
 
-            desc = rowv["DESCRIÇÃO"]
-            is_especial = desc in [
-                "A = Valor Total (R$)",
-                "B = Valor Recebido - Autor (a)",
-                "Indébito (A-B)",
-                "Indébito em dobro (R$)"
-            ]
-
-            if is_especial:
+            if is_especial[i]:
                 self.set_font("Arial", "B", 11)
                 self.set_text_color(255, 0, 0)
             else:
                 self.set_font("Arial", "", 9)
                 self.set_text_color(0, 0, 0)
 
-            row_vals = []
-            for col_h in col_names:
-                val = str(rowv[col_h]) if col_h in rowv else ""
-                if col_h == "DESCONTOS" and val.strip():
-                    val = formatar_valor_brl(val)
-                row_vals.append(val)
-
             # Imprime linha
-            for col_h, valv in zip(col_names, row_vals):
-                w = widths_map.get(col_h, 40)
-                align = 'C'
-                if col_h.upper() == "DESCRIÇÃO":
-                    align = 'L'
-                self.cell(w, row_h, valv, border=1, align=align)
+            for valores, w, align in col_specs:
+                self.cell(w, row_h, valores[i], border=1, align=align)
             self.ln(row_h)
+            self._row_on_page += 1
 
-            if is_especial:
+            if is_especial[i]:
                 self.set_font("Arial", "", 9)
                 self.set_text_color(0, 0, 0)
 
-    def gerar_pdf(self, df, out_path):
+    def gerar_pdf(self, colunas, is_especial) -> bytes:
         self.add_page()
-        self.montar_tabela(df)
-        self.output(out_path)
+        self.montar_tabela(colunas, is_especial)
+        return bytes(self.output())
+
+
+def preparar_colunas_finais(df: pd.DataFrame):
+    """
+    Prepara os dados de "Descontos Finais" para os relatórios (PDF e DOCX):
+    retorna (colunas, is_especial), onde 'colunas' é um dict
+    {nome da coluna: lista de textos}, com DESCONTOS já no padrão PT-BR,
+    e 'is_especial' indica as linhas A/B/Indébito.
+    """
+    if "DESCONTOS" in df.columns:
+        df = df.assign(DESCONTOS=formatar_coluna_brl(df["DESCONTOS"]))
+    colunas = {c: df[c].astype(str).tolist() for c in df.columns}
+    if "DESCRIÇÃO" in df.columns:
+        is_especial = df["DESCRIÇÃO"].isin(LINHAS_ESPECIAIS).tolist()
+    else:
+        is_especial = [False] * len(df)
+    return colunas, is_especial
 
 
-def gerar_pdf_finais(df: pd.DataFrame, titulo: str) -> bytes:
+def gerar_pdf_finais(colunas, is_especial, titulo: str) -> bytes:
     pdf = PDFFinais(titulo)
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmpf:
-        out_path = tmpf.name
-    pdf.gerar_pdf(df, out_path)
-    with open(out_path, "rb") as f:
-        data_bytes = f.read()
-    os.remove(out_path)
-    return data_bytes
+    return pdf.gerar_pdf(colunas, is_especial)
 
 
 # -----------------------------------------------------------------
 # RELATÓRIO DOCX “Descontos Finais”
 # -----------------------------------------------------------------
-def gerar_docx_finais(df: pd.DataFrame, titulo: str) -> bytes:
+@st.cache_data
+def _modelo_docx_paisagem() -> bytes:
+    """
+    Gera (uma única vez) um DOCX vazio já em orientação paisagem,
+    usado como modelo pelos relatórios DOCX.
+    """
+    doc = Document()
+    for section in doc.sections:
+        section.orientation = WD_ORIENT.LANDSCAPE
+        new_width, new_height = section.page_height, section.page_width
+        section.page_width = new_width
+        section.page_height = new_height
+    buf = BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def gerar_docx_finais(colunas, is_especial, titulo: str) -> bytes:
     """
     Gera DOCX com as mesmas configurações do PDF "Descontos Finais":
     - Orientação paisagem;
     - Título principal centralizado;
     - Tabela com colunas: COD(30mm), DESCRIÇÃO(120mm), DESCONTOS(40mm), DATA(30mm);
     - Linhas especiais (A/B/Indébito) em vermelho, tamanho 11, negrito;
-    - Converte valores de DESCONTOS para padrão PT-BR.
+    - Valores de DESCONTOS já em padrão PT-BR (ver preparar_colunas_finais).
     """
-    import re
-
     # Faz ajuste no título (eventual troca de vírgula por ponto, se quiser)
     # Aqui mantemos a substituição para casos como "14,642-0" -> "14.642-0"
-    titulo_ajust = re.sub(r"(\d+),(\d{3}-\d\s*[A-Za-z])", r"\1.\2", titulo)
+    titulo_ajust = _RE_MATR_TITLE.sub(r"\1.\2", titulo)
 
-    doc = Document()
-    for section in doc.sections:
-        section.orientation = WD_ORIENT.LANDSCAPE
-        new_width, new_height = section.page_height, section.page_width
-        section.page_width = new_width
-        section.page_height = new_height
+    doc = Document(BytesIO(_modelo_docx_paisagem()))
 
     # Título
     titulo_heading = doc.add_heading(titulo_ajust, level=1)
     titulo_heading.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
-    if df.empty:
+    n_linhas = len(is_especial)
+    if n_linhas == 0:
         p = doc.add_paragraph("DataFrame vazio - nenhum dado para exibir.")
         p.alignment = WD_ALIGN_PARAGRAPH.CENTER
         buf = BytesIO()
@@ -566,53 +658,45 @@ def gerar_docx_finais(df: pd.DataFrame, titulo: str) -> bytes:
     table = doc.add_table(rows=1, cols=len(col_names))
     table.style = 'Table Grid'
 
+    # Fonte padrão (Arial 9, preto) definida uma vez no estilo; só as linhas especiais sobrescrevem
+    fonte_normal = doc.styles['Normal'].font
+    fonte_normal.name = "Arial"
+    fonte_normal.size = Pt(9)
+    fonte_normal.color.rgb = RGBColor(0, 0, 0)
+
+    # Larguras (mm -> inches) e alinhamentos por coluna
+    larguras = [Inches(widths_map[col_h] / 25.4) for col_h in col_names]
+    alinhamentos = [
+        WD_ALIGN_PARAGRAPH.LEFT if col_h == "DESCRIÇÃO" else WD_ALIGN_PARAGRAPH.CENTER
+        for col_h in col_names
+    ]
+
     # Cabeçalho
     hdr_cells = table.rows[0].cells
     for i, col_h in enumerate(col_names):
+        hdr_cells[i].width = larguras[i]
         hdr_cells[i].text = col_h
         for parag in hdr_cells[i].paragraphs:
             for run in parag.runs:
                 run.font.bold = True
-                run.font.name = "Arial"
                 run.font.size = Pt(10)
 
-    # Linhas
-    for _, rowv in df.iterrows():
+    # Linhas (colunas ausentes ficam vazias)
+    valores_cols = [colunas.get(col_h, [""] * n_linhas) for col_h in col_names]
+    for i in range(n_linhas):
         row_cells = table.add_row().cells
-        desc_val = rowv.get("DESCRIÇÃO", "")
-        is_especial = desc_val in [
-            "A = Valor Total (R$)",
-            "B = Valor Recebido - Autor (a)",
-            "Indébito (A-B)",
-            "Indébito em dobro (R$)"
-        ]
-
-        for j, col_h in enumerate(col_names):
-            val = str(rowv.get(col_h, ""))
-            if col_h == "DESCONTOS" and val.strip():
-                val = formatar_valor_brl(val)
+        especial = is_especial[i]
 
+        for j in range(len(col_names)):
+            row_cells[j].width = larguras[j]
             para = row_cells[j].paragraphs[0]
-            run = para.add_run(val)
-            run.font.name = "Arial"
+            para.alignment = alinhamentos[j]
+            run = para.add_run(valores_cols[j][i])
 
-            if is_especial:
+            if especial:
                 run.font.bold = True
                 run.font.size = Pt(11)
                 run.font.color.rgb = RGBColor(255, 0, 0)
-            else:
-                run.font.size = Pt(9)
-                run.font.color.rgb = RGBColor(0, 0, 0)
-
-            if col_h == "DESCRIÇÃO":
-                para.alignment = WD_ALIGN_PARAGRAPH.LEFT
-            else:
-                para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-    # Ajusta larguras (mm -> inches)
-    for i, col_h in enumerate(col_names):
-        width_inches = widths_map[col_h] / 25.4
-        table.columns[i].width = Inches(width_inches)
 
     buf = BytesIO()
     doc.save(buf)
@@ -624,37 +708,44 @@ def ajustar_valores_docx(file_input_bytes: bytes) -> bytes:
     Exemplo de função para varrer o DOCX e ajustar valores, se necessário.
     Aqui não está sendo usada, mas mantida como referência.
     """
-    import re
-    from docx import Document
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp_in:
-        tmp_in.write(file_input_bytes)
-        tmp_in.flush()
-        in_path = tmp_in.name
-    out_path = in_path.replace(".docx", "_corrigido.docx")
-
-    doc = Document(in_path)
-    pattern = re.compile(r'([\d,]+\.\d{2})')
+    doc = Document(BytesIO(file_input_bytes))
     for para in doc.paragraphs:
-        found = pattern.findall(para.text)
-        for val_us in found:
-            try:
-                base_float = float(val_us.replace(",", "").replace(".", "")) / 100
-                val_br = f"{base_float:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-            except:
-                val_br = val_us
-            para.text = para.text.replace(val_us, val_br)
-
-    doc.save(out_path)
-    with open(out_path, "rb") as f:
-        data_bytes = f.read()
-    os.remove(in_path)
-    os.remove(out_path)
-    return data_bytes
+        # Substitui todos os valores do parágrafo numa única passada
+        novo_texto = _RE_VALOR_US.sub(lambda m: formatar_valor_brl(m.group(1)), para.text)
+        if novo_texto != para.text:
+            para.text = novo_texto
+
+    buf = BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
 
 
 # -----------------------------------------------------------------
 # CRUZAR DESCONTOS COM GLOSSÁRIO
 # -----------------------------------------------------------------
+def normalizar_texto(texto) -> str:
+    """
+    Remove acentos, pontuação e diferenças de caixa para a comparação fuzzy.
+    """
+    sem_acento = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode("ascii")
+    return utils.default_process(sem_acento).upper()
+
+
+@st.cache_data
+def _matriz_similaridade(descricoes: tuple, rubricas: tuple):
+    """
+    Calcula a matriz de similaridade (descrições x rubricas) já normalizadas.
+    Fica em cache para que mudanças de threshold não refaçam o cálculo.
+    """
+    return process.cdist(
+        [normalizar_texto(d) for d in descricoes],
+        [normalizar_texto(r) for r in rubricas],
+        scorer=fuzz.ratio,
+        dtype=np.uint8,
+        workers=-1
+    )
+
+
 def cruzar_descontos_com_rubricas(df_descontos, rubricas, threshold=85):
     """
     Faz fuzzy matching das colunas 'DESCRIÇÃO' em df_descontos com a lista de rubricas,
@@ -664,10 +755,8 @@ def cruzar_descontos_com_rubricas(df_descontos, rubricas, threshold=85):
         return pd.DataFrame()
 
     unique_desc = df_descontos["DESCRIÇÃO"].unique()
-    mapping = {}
-    for desc in unique_desc:
-        result = process.extractOne(desc, rubricas, scorer=fuzz.ratio)
-        mapping[desc] = (result is not None and result[1] >= threshold)
+    scores = _matriz_similaridade(tuple(unique_desc), tuple(rubricas))
+    mapping = dict(zip(unique_desc, scores.max(axis=1) >= threshold))
 
     mask = df_descontos["DESCRIÇÃO"].map(mapping)
     return df_descontos[mask]
@@ -701,23 +790,10 @@ def main():
 
     # Se o usuário enviou um PDF, processa...
     if uploaded_pdf is not None:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(uploaded_pdf.read())
-            pdf_path = tmp_file.name
-
-        try:
-            # Extrair nome e matrícula
-            nome_final, nit_final = extrair_nome_e_matricula(pdf_path)
-            set_state_value("nome_extraido", nome_final)
-            set_state_value("nit_extraido", nit_final)
-
-            # Ler tabelas Camelot
-            df_contra = processar_contracheques_camelot(pdf_path)
-            set_state_value("df_contracheques", df_contra)
-
-        finally:
-            # Remove o arquivo temporário do PDF original
-            os.unlink(pdf_path)
+        df_contra, nome_final, nit_final = _processar_pdf(uploaded_pdf.getvalue())
+        set_state_value("nome_extraido", nome_final)
+        set_state_value("nit_extraido", nit_final)
+        set_state_value("df_contracheques", df_contra)
 
     # Recupera DataFrame e nome/nit do estado
     df_contra = get_state_value("df_contracheques")
@@ -764,12 +840,13 @@ def main():
 
         if btn_gloss:
             # Ajusta colunas para padronizar => "DESCRIÇÃO", "DESCONTOS"
-            df_aux = df_contra.copy()
-            df_aux.rename(columns={
+            # (sem cópia prévia: o filtro abaixo já gera um novo DataFrame)
+            df_aux = df_contra.rename(columns={
                 "Descrição": "DESCRIÇÃO",
                 "TOTAL": "DESCONTOS"
-            }, inplace=True)
-            df_aux = df_aux[df_aux["DESCONTOS"].str.strip() != ""]
+            }, copy=False)
+            mask = df_aux["DESCONTOS"].str.strip().ne("")
+            df_aux = df_aux.loc[mask].reset_index(drop=True)
             set_state_value("df_descontos", df_aux)
 
             threshold_val = int(thresh * 100)
@@ -789,14 +866,24 @@ def main():
                 df_sel = df_desc_gloss
 
             with st.form("form_inclusao_descontos"):
-                valores_unicos = sorted(df_sel["DESCRIÇÃO"].unique())
+                # Contagem por descrição numa única passada (já fornece os valores únicos)
+                contagens = df_sel["DESCRIÇÃO"].value_counts()
+                valores_unicos = sorted(contagens.index)
                 st.write("Marque os itens que deseja incluir:")
-                selected_descr = []
-                for i, val_item in enumerate(valores_unicos):
-                    qtd = df_sel[df_sel["DESCRIÇÃO"] == val_item].shape[0]
-                    label_str = f"{i + 1} - {val_item} (Qtd: {qtd})"
-                    if st.checkbox(label_str, key=f"chk_{i}"):
-                        selected_descr.append(val_item)
+                # Um único widget (tabela editável) no lugar de um checkbox por descrição
+                df_escolhas = pd.DataFrame({
+                    "Incluir": False,
+                    "Descrição": valores_unicos,
+                    "Qtd": contagens.loc[valores_unicos].to_numpy()
+                })
+                df_editado = st.data_editor(
+                    df_escolhas,
+                    hide_index=True,
+                    disabled=["Descrição", "Qtd"],
+                    use_container_width=True,
+                    key="editor_inclusao_descontos"
+                )
+                selected_descr = df_editado.loc[df_editado["Incluir"], "Descrição"].tolist()
                 btn_incluir = st.form_submit_button("Confirmar Inclusão (Descontos)")
 
             if btn_incluir:
@@ -823,16 +910,22 @@ def main():
 
                 if btn_final:
                     df_final = df_final_sel.copy()
-                    # Ordena por DATA, se existir
+                    # Ordena por DATA (MM/AAAA) cronologicamente, se existir
                     if "DATA" in df_final.columns:
-                        df_final = df_final.sort_values(by="DATA").reset_index(drop=True)
+                        df_final = df_final.sort_values(
+                            by="DATA",
+                            key=lambda s: pd.to_datetime(s, format="%m/%Y", errors="coerce"),
+                            kind="stable"
+                        ).reset_index(drop=True)
 
                     # Insere as linhas A/B/Indébito
                     df_final = inserir_totais_na_coluna(df_final, "DESCONTOS")
+                    # Colunas como listas de texto, compartilhadas por PDF e DOCX
+                    colunas_finais, is_especial = preparar_colunas_finais(df_final)
 
                     # Gera PDF Finais
                     final_title = f"Descontos Finais - {nome_user} - {nit_user}"
-                    pdf_fin_bytes = gerar_pdf_finais(df_final, final_title)
+                    pdf_fin_bytes = gerar_pdf_finais(colunas_finais, is_especial, final_title)
                     pdf_fin_name = f"Contracheque_Descontos_Finais_{nome_user}_{nit_user}.pdf"
                     st.download_button(
                         label="Baixar PDF (Descontos Finais)",
@@ -842,7 +935,7 @@ def main():
                     )
 
                     # Gera DOCX Finais
-                    docx_bytes = gerar_docx_finais(df_final, final_title)
+                    docx_bytes = gerar_docx_finais(colunas_finais, is_especial, final_title)
                     docx_fin_name = pdf_fin_name.replace(".pdf", ".docx")
                     st.download_button(
                         label="Baixar DOCX (Descontos Finais)",